@@ -0,0 +1,154 @@
+import logging
+import os
+import subprocess
+import threading
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+# ffmpeg audio arguments for each supported output format
+CODEC_ARGS = {
+    "m4a": ["-c:a", "aac", "-b:a", "256k"],
+    "opus": ["-c:a", "libopus", "-b:a", "160k"],
+    "mp3": ["-c:a", "libmp3lame", "-q:a", "0"],
+    "flac": ["-c:a", "flac"],
+}
+
+# yt-dlp "acodec" values that are stream-copied instead of re-encoded,
+# e.g. YouTube's bestaudio is usually "opus" and sometimes "mp4a.40.2"
+COPY_CODECS = {
+    "m4a": ("mp4a", "aac"),
+    "opus": ("opus",),
+    "mp3": ("mp3",),
+    "flac": ("flac",),
+}
+
+logger = logging.getLogger(__name__)
+
+
+def can_copy(acodec, fmt):
+    """True if audio in the acodec reported by yt-dlp fits fmt without re-encoding."""
+    if not acodec:
+        return False
+    return acodec.split(".")[0].lower() in COPY_CODECS.get(fmt, ())
+
+
+def encode_track(ffmpeg_path, source, target, fmt, copy=False):
+    """
+    Encodes one downloaded file into the given format with ffmpeg.
+    Existing files are never overwritten; a failed encode leaves no file behind.
+    """
+    command = [
+        ffmpeg_path,
+        "-n",
+        "-loglevel",
+        "error",
+        "-i",
+        source,
+        "-vn",
+        "-map_metadata",
+        "0",
+        *(["-c:a", "copy"] if copy else CODEC_ARGS[fmt]),
+        target,
+    ]
+    existed = os.path.exists(target)
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        if not existed:
+            try:
+                os.remove(target)
+            except OSError:
+                pass
+        message = result.stderr.strip() or f"ffmpeg exited with {result.returncode}"
+        raise RuntimeError(message)
+    return target
+
+
+class MultiFormatEncoder:
+    """
+    Encodes each downloaded track into several formats in parallel.
+
+    Every format is written to its own folder inside the output directory,
+    e.g. "<output>/m4a" and "<output>/opus". Formats that already exist are
+    kept as they are. The downloaded source file is removed once all of its
+    encodes have finished.
+    """
+
+    def __init__(self, ffmpeg_path, output_dir, formats, max_workers=None):
+        self.ffmpeg_path = ffmpeg_path
+        self.output_dir = output_dir
+        self.formats = list(formats)
+        # Each encode is its own ffmpeg process, so threads are enough to
+        # keep all CPU cores busy
+        self.pool = ThreadPoolExecutor(
+            max_workers=max_workers or max(len(self.formats), os.cpu_count() or 1)
+        )
+        for fmt in self.formats:
+            os.makedirs(self.format_dir(fmt), exist_ok=True)
+
+    def format_dir(self, fmt):
+        return os.path.join(self.output_dir, fmt)
+
+    def target_path(self, source, fmt):
+        name = os.path.splitext(os.path.basename(source))[0]
+        return os.path.join(self.format_dir(fmt), f"{name}.{fmt}")
+
+    def targets_exist(self, source):
+        """True if every format of the track has already been written."""
+        return all(
+            os.path.exists(self.target_path(source, fmt)) for fmt in self.formats
+        )
+
+    def submit(self, source, on_done, acodec=None):
+        """
+        Starts the encodes of one track; acodec is the source codec reported by
+        yt-dlp, formats using the same codec are stream-copied.
+        on_done(source, targets, errors) is called from a pool thread when the
+        last encode has finished or was cancelled; targets are listed in
+        self.formats order.
+        """
+        pending = [
+            fmt
+            for fmt in self.formats
+            if not os.path.exists(self.target_path(source, fmt))
+        ]
+        lock = threading.Lock()
+        remaining = [len(pending)]
+        errors = []
+
+        def encode_finished(future):
+            # exception() would raise on a future dropped by shutdown(cancel=True)
+            error = CancelledError() if future.cancelled() else future.exception()
+            with lock:
+                if error is not None:
+                    errors.append(error)
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            finish()
+
+        def finish():
+            targets = [self.target_path(source, fmt) for fmt in self.formats]
+            try:
+                os.remove(source)
+            except OSError as e:
+                logger.error(
+                    f"Could not remove downloaded file {source}: {e}",
+                    extra={"stage": "encode"},
+                )
+            on_done(source, targets, errors)
+
+        if not pending:
+            finish()
+        for fmt in pending:
+            future = self.pool.submit(
+                encode_track,
+                self.ffmpeg_path,
+                source,
+                self.target_path(source, fmt),
+                fmt,
+                can_copy(acodec, fmt),
+            )
+            future.add_done_callback(encode_finished)
+
+    def shutdown(self, cancel=False):
+        """Waits for the queued encodes, or drops them if cancel is True."""
+        self.pool.shutdown(wait=True, cancel_futures=cancel)
@@ -0,0 +1,104 @@
+import sqlite3
+from urllib.parse import urlparse
+
+# Only tracks at least this long are split into parallel range requests
+LONG_TRACK_SECONDS = 20 * 60
+
+MIN_CONCURRENCY = 1
+MAX_CONCURRENCY = 16
+MIN_CHUNK_SIZE = 1 << 20
+MAX_CHUNK_SIZE = 16 << 20
+# Aim for chunks that take each connection about this long to fetch
+CHUNK_SECONDS = 4
+
+
+def host_key(url):
+    """Groups media hosts by domain: rr1---sn-x.googlevideo.com -> googlevideo.com"""
+    host = urlparse(url).hostname or ""
+    return ".".join(host.split(".")[-2:])
+
+
+class DownloadTuner:
+    """
+    Chooses fragment concurrency and chunk size per host from measured throughput.
+
+    Concurrency is hill-climbed: it keeps moving in the same direction while
+    throughput improves by more than 10% and turns around when it drops.
+    Settings are stored in settings.db so they survive restarts.
+    """
+
+    def __init__(self, db_file="settings.db"):
+        self.db_file = db_file
+        self.conn = sqlite3.connect(self.db_file)
+        self.create_table()
+
+    def create_table(self):
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS download_tuning (
+                    host TEXT PRIMARY KEY,
+                    concurrency INTEGER NOT NULL,
+                    chunk_size INTEGER NOT NULL,
+                    throughput REAL,
+                    step INTEGER NOT NULL DEFAULT 1
+                )
+            """)
+
+    def get_settings(self, host):
+        """Returns (concurrency, chunk_size) to use for the host."""
+        with self.conn:
+            row = self.conn.execute(
+                "SELECT concurrency, chunk_size FROM download_tuning WHERE host = ?",
+                (host,),
+            ).fetchone()
+        return row or (4, 10 << 20)
+
+    def record(self, host, concurrency, chunk_size, size, elapsed):
+        """Stores the throughput of a finished download and picks the next settings."""
+        if not size or not elapsed:
+            return
+        throughput = size / elapsed
+        # Speed of one connection in the measured run, before the step below
+        per_connection = throughput / concurrency
+        with self.conn:
+            row = self.conn.execute(
+                "SELECT throughput, step FROM download_tuning WHERE host = ?",
+                (host,),
+            ).fetchone()
+            previous, step = row or (None, 1)
+
+            if previous is None or throughput > previous * 1.1:
+                # Better: keep moving the same way
+                step = step or 1
+                best = throughput
+            elif throughput < previous * 0.9:
+                # Worse: go back the other way; the baseline decays in case
+                # the host itself got slower
+                step = -step or -1
+                best = (previous + throughput) / 2
+            else:
+                # Within noise: settle, undoing an increase that gained nothing
+                if step > 0:
+                    concurrency = max(concurrency // 2, MIN_CONCURRENCY)
+                step = 0
+                best = max(previous, throughput)
+
+            if step > 0:
+                concurrency = min(concurrency * 2, MAX_CONCURRENCY)
+            elif step < 0:
+                concurrency = max(concurrency // 2, MIN_CONCURRENCY)
+
+            chunk_size = int(per_connection * CHUNK_SECONDS)
+            chunk_size = min(max(chunk_size, MIN_CHUNK_SIZE), MAX_CHUNK_SIZE)
+
+            self.conn.execute(
+                """
+                INSERT OR REPLACE INTO download_tuning
+                    (host, concurrency, chunk_size, throughput, step)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                (host, concurrency, chunk_size, best, step),
+            )
+
+    def close(self):
+        self.conn.close()
@@ -1,8 +1,19 @@
 import logging
 import os
+import shutil
+import time
+from concurrent.futures import CancelledError
 from shutil import which
 
+from AudioEncoder import MultiFormatEncoder
+from DownloadTuner import LONG_TRACK_SECONDS, DownloadTuner, host_key
 from PySide6.QtCore import QObject, Signal
+from YtdlSession import YtdlSession
+
+logger = logging.getLogger(__name__)
+
+# Downloads wait here for MultiFormatEncoder when several formats are requested
+STAGING_DIR = ".staging"
 
 
 class DownloaderWorker(QObject):
@@ -16,77 +27,317 @@ class DownloaderWorker(QObject):
     finished = Signal()
     error = Signal(str)
 
-    def __init__(self, url, output_dir):
+    # Resolved once and shared by all workers
+    ffmpeg_path = None
+
+    def __init__(
+        self,
+        url,
+        output_dir,
+        library_index=None,
+        formats=("m4a",),
+        session=None,
+        started_at=None,
+    ):
         super().__init__()
         self.playlist_url = url
         self.output_dir = output_dir
+        self.library_index = library_index
+        self.formats = list(formats)
+        # A warm YtdlSession shared between runs; a private one is used otherwise
+        self.session = session
+        # The session of the current run, which knows yt-dlp's file names
+        self.run_session = None
+        # perf_counter() of the click on "Start Download", for time-to-first-bytes
+        self.started_at = started_at if started_at is not None else time.perf_counter()
+        self.first_bytes_reported = False
+        # Set when several formats are requested: tracks are downloaded once
+        # into a staging folder and encoded by MultiFormatEncoder
+        self.encoder = None
+        # Per-host fragment settings, and the settings used for tracks in flight
+        self.tuner = None
+        self.active_tuning = {}
+        # Error that aborted the whole run (e.g. missing ffmpeg), not one track
+        self.critical_error = None
         self.is_running = True
 
     def get_ffmpeg_path(self):
-        path = which("ffmpeg")
-        if path:
-            return path
-        logging.fatal("FFmpeg not found in PATH")
+        if DownloaderWorker.ffmpeg_path is None:
+            DownloaderWorker.ffmpeg_path = which("ffmpeg")
+        if DownloaderWorker.ffmpeg_path:
+            return DownloaderWorker.ffmpeg_path
+        logger.critical("FFmpeg not found in PATH", extra={"stage": "setup"})
         raise FileNotFoundError("FFmpeg not found in PATH")
 
+    def check_cancelled(self):
+        """Aborts the whole yt-dlp run once the job has been cancelled."""
+        if not self.is_running:
+            from yt_dlp.utils import DownloadCancelled
+
+            # Unlike other errors, yt-dlp re-raises this even with ignoreerrors
+            raise DownloadCancelled("Download stopped by user.")
+
     def progress_hook(self, d):
         """Hook to track download status from yt-dlp."""
-        if not self.is_running:
-            raise Exception("Download stopped by user.")
+        self.check_cancelled()
 
-        if d["status"] == "finished":
+        if (
+            d["status"] == "downloading"
+            and d.get("downloaded_bytes")
+            and not self.first_bytes_reported
+        ):
+            self.first_bytes_reported = True
+            elapsed = time.perf_counter() - self.started_at
+            self.progress.emit(f"⏱️ First bytes after {elapsed:.1f} s")
+            logger.info(
+                "First bytes received",
+                extra={
+                    "track_id": d.get("info_dict", {}).get("id"),
+                    "stage": "first_bytes",
+                    "duration": elapsed,
+                },
+            )
+        elif d["status"] == "finished":
+            self.record_throughput(d)
+            logger.info(
+                "Download finished",
+                extra={
+                    "track_id": d.get("info_dict", {}).get("id"),
+                    "stage": "download",
+                    "duration": d.get("elapsed"),
+                    "size": d.get("total_bytes") or d.get("downloaded_bytes"),
+                },
+            )
             file_path = d.get("filename") or d.get("info_dict", {}).get("_filename")
-            if file_path:
+            # With several formats, the track is reported once encoded
+            if file_path and self.encoder is None:
+                if self.library_index is not None:
+                    self.library_index.add(file_path)
                 self.progress.emit(f"✔️ Finished: {os.path.basename(file_path)}")
                 self.track_success.emit(file_path)
         elif d["status"] == "error":
             error_message = d.get("error", "Unknown download error")
             filename = d.get("filename", "Unknown file")
             self.progress.emit(f"⛔ Download error '{os.path.basename(filename)}'.")
-            logging.error(f"Download error for {filename}: {error_message}")
+            logger.error(
+                f"Download error for {filename}: {error_message}",
+                extra={
+                    "track_id": d.get("info_dict", {}).get("id"),
+                    "stage": "download",
+                },
+            )
             self.track_fail.emit(filename)
 
+    def encode_track(self, ydl, info):
+        """After yt-dlp has finished with a file: hand it to the encoder."""
+        file_path = info.get("filepath")
+        if self.encoder is None or not file_path:
+            return
+        self.progress.emit(f"🎛️ Encoding: {os.path.basename(file_path)}")
+        self.encoder.submit(file_path, self.on_track_encoded, info.get("acodec"))
+
+    def on_track_encoded(self, source, targets, errors):
+        """Called by MultiFormatEncoder once all formats of a track are written."""
+        name = os.path.basename(source)
+        if any(isinstance(error, CancelledError) for error in errors):
+            self.progress.emit(f"⛔ Encoding cancelled '{name}'.")
+            self.track_fail.emit(source)
+            return
+        if errors:
+            self.progress.emit(f"⛔ Encoding error '{name}'.")
+            for error in errors:
+                logger.error(
+                    f"Encoding error for {source}: {error}", extra={"stage": "encode"}
+                )
+            self.track_fail.emit(source)
+            return
+        if self.library_index is not None:
+            self.library_index.add(targets[0])
+        self.progress.emit(f"✔️ Finished: {name} ({', '.join(self.formats)})")
+        self.track_success.emit(targets[0])
+
+    def tune_download(self, ydl, info):
+        """Before each download: split long tracks into parallel range requests."""
+        self.check_cancelled()
+        params = ydl.params
+        if (info.get("duration") or 0) < LONG_TRACK_SECONDS or not info.get("url"):
+            params["concurrent_fragment_downloads"] = 1
+            params.pop("http_chunk_size", None)
+            return
+
+        from yt_dlp.utils import update_url_query
+
+        host = host_key(info["url"])
+        concurrency, chunk_size = self.tuner.get_settings(host)
+        params["concurrent_fragment_downloads"] = concurrency
+        params["http_chunk_size"] = chunk_size
+
+        # Re-split "dashy" formats with the tuned chunk size
+        filesize = info.get("filesize")
+        if info.get("protocol") == "http_dash_segments" and filesize:
+            info["fragments"] = [
+                {
+                    "url": update_url_query(
+                        info["url"],
+                        {"range": f"{start}-{min(start + chunk_size - 1, filesize)}"},
+                    )
+                }
+                for start in range(0, filesize, chunk_size)
+            ]
+
+        self.active_tuning[info.get("id")] = (host, concurrency, chunk_size)
+        self.progress.emit(
+            f"⚡ {info.get('title', 'Track')}: {concurrency} connections, "
+            f"{chunk_size >> 20} MB chunks"
+        )
+
+    def record_throughput(self, d):
+        """Feeds the measured speed of a tuned download back into the tuner."""
+        info_dict = d.get("info_dict", {})
+        tuning = self.active_tuning.pop(info_dict.get("id"), None)
+        if tuning is None or self.tuner is None:
+            return
+        host, concurrency, chunk_size = tuning
+        size = d.get("total_bytes") or d.get("downloaded_bytes")
+        self.tuner.record(host, concurrency, chunk_size, size, d.get("elapsed"))
+
+    def library_filter(self, info_dict, *, incomplete=False):
+        """
+        yt-dlp match_filter: skips entries that probably exist in the library,
+        or whose formats have all been encoded already.
+        """
+        # Runs before every entry is extracted, so a cancelled run stops here
+        self.check_cancelled()
+        if info_dict.get("_type") == "playlist":
+            return None
+        title = info_dict.get("title") or info_dict.get("id", "Unknown track")
+        if (
+            self.library_index is not None
+            and self.library_index.find(info_dict) is not None
+        ):
+            self.progress.emit(f"⏭️ Already in library: {title}")
+            return f"{title} already exists in the library"
+        # The staging folder is emptied after every run, so yt-dlp's own
+        # "already downloaded" check never sees encoded tracks. Only complete
+        # entries have the fields the output template needs.
+        if self.encoder is not None and not incomplete:
+            source = self.run_session.prepare_filename(info_dict)
+            if self.encoder.targets_exist(source):
+                self.progress.emit(f"⏭️ Already downloaded: {title}")
+                return f"{title} already exists in all formats"
+        return None
+
+    def create_downloader(self, ydl_opts):
+        """Builds the YoutubeDL instance used for the run."""
+        import yt_dlp
+
+        return yt_dlp.YoutubeDL(ydl_opts)
+
+    def build_ydl_opts(self, ffmpeg_path):
+        """Options for yt-dlp; per-run callbacks are bound by the session."""
+        download_dir = self.output_dir
+        postprocessors = [
+            {
+                "key": "FFmpegExtractAudio",
+                "preferredcodec": self.formats[0],
+                "preferredquality": "best",
+            }
+        ]
+        if len(self.formats) > 1:
+            download_dir = os.path.join(self.output_dir, STAGING_DIR)
+            postprocessors = []
+
+        return {
+            "format": "bestaudio/best",
+            "outtmpl": os.path.join(
+                download_dir, "%(artist,uploader)s - %(track,title)s.%(ext)s"
+            ),
+            "postprocessors": postprocessors,
+            "ffmpeg_location": ffmpeg_path,
+            "ignoreerrors": True,  # Very important to not stop on errors
+            "logger": logging.getLogger("yt_dlp"),
+            "quiet": True,
+            "noprogress": True,  # Use custom progress
+            "cookies_from_browser": ("chrome",),
+            #  If True - replace spaces and special characters (e.g. ., (, )) with underscores (_).
+            "restrictfilenames": False,
+            "trim_filenames": 40,
+            # Serve YouTube https formats as ranged fragments, so long
+            # tracks can be fetched over several connections
+            "extractor_args": {"youtube": {"formats": ["dashy"]}},
+            "concurrent_fragment_downloads": 1,
+            "buffersize": 64 * 1024,
+            "sleep_interval": 3,
+            "max_sleep_interval": 10,
+        }
+
+    def warm_up(self):
+        """Prepares the session with this worker's options before any run."""
+        self.session.warm_up(self.build_ydl_opts(self.get_ffmpeg_path()))
+
     def run(self):
         """Main method that starts the download process."""
+        session = self.session or YtdlSession(self.create_downloader)
+        self.run_session = session
         try:
-            ydl_opts = {
-                "format": "bestaudio/best",
-                "outtmpl": os.path.join(
-                    self.output_dir, "%(artist,uploader)s - %(track,title)s.%(ext)s"
-                ),
-                "postprocessors": [
-                    {
-                        "key": "FFmpegExtractAudio",
-                        "preferredcodec": "m4a",
-                        "preferredquality": "best",
-                    }
-                ],
-                "ffmpeg_location": self.get_ffmpeg_path(),
-                "ignoreerrors": True,  # Very important to not stop on errors
-                "progress_hooks": [self.progress_hook],
-                "logger": logging.getLogger(),
-                "quiet": True,
-                "noprogress": True,  # Use custom progress
-                "cookies_from_browser": ("chrome",),
-                #  If True - replace spaces and special characters (e.g. ., (, )) with underscores (_).
-                "restrictfilenames": False,
-                "trim_filenames": 40,
-                "sleep_interval": 3,
-                "max_sleep_interval": 10,
-            }
+            ffmpeg_path = self.get_ffmpeg_path()
+            ydl_opts = self.build_ydl_opts(ffmpeg_path)
+            if len(self.formats) > 1:
+                self.encoder = MultiFormatEncoder(
+                    ffmpeg_path, self.output_dir, self.formats
+                )
 
             self.progress.emit(f"Starting playlist download: {self.playlist_url}")
             self.progress.emit(f"📂 Saving to: {self.output_dir}")
 
-            import yt_dlp
+            # Checked on flat playlist entries before anything is fetched
+            ydl_opts["match_filter"] = self.library_filter
+            if self.library_index is not None:
+                self.library_index.sync()
+                self.progress.emit(
+                    f"📚 Library index: {len(self.library_index)} existing files"
+                )
+
+            self.tuner = DownloadTuner()
+
+            session.download(
+                [self.playlist_url],
+                ydl_opts,
+                self.progress_hook,
+                self.tune_download,
+                self.encode_track,
+            )
 
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([self.playlist_url])
+            if self.encoder is not None:
+                self.progress.emit("🎛️ Waiting for remaining encodes…")
+                self.encoder.shutdown(cancel=not self.is_running)
+                self.encoder = None
 
             self.progress.emit("✔️ All downloads completed.")
 
         except Exception as e:
+            if not self.is_running:
+                self.progress.emit("⛔ Download stopped by user.")
+                return
+            self.critical_error = e
             self.error.emit(f"Critical error: {e}")
-            logging.fatal(f"An unexpected error occurred in downloader thread: {e}")
+            logger.critical(
+                f"An unexpected error occurred in downloader thread: {e}",
+                extra={"stage": "run"},
+            )
         finally:
+            if self.encoder is not None:
+                self.encoder.shutdown(cancel=True)
+                self.encoder = None
+            if len(self.formats) > 1:
+                # Leftovers of failed or cancelled encodes
+                shutil.rmtree(
+                    os.path.join(self.output_dir, STAGING_DIR), ignore_errors=True
+                )
+            if self.tuner is not None:
+                self.tuner.close()
+                self.tuner = None
+            if session is not self.session:
+                session.close()
+            self.run_session = None
             self.finished.emit()
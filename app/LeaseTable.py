@@ -0,0 +1,133 @@
+import sqlite3
+import time
+
+
+class LeaseTable:
+    """
+    Shared table of playlist entries that download workers lease one at a time.
+
+    A lease expires unless the worker renews it, so entries held by a worker
+    that died are picked up again by the others.
+    """
+
+    def __init__(self, db_file="leases.db", max_attempts=3):
+        self.db_file = db_file
+        self.max_attempts = max_attempts
+        # Autocommit mode, transactions are opened explicitly with BEGIN IMMEDIATE
+        self.conn = sqlite3.connect(self.db_file, timeout=30, isolation_level=None)
+        # Rollback journal rather than WAL: WAL needs shared memory on a single
+        # host and does not work when the file is on a network share
+        self.conn.execute("PRAGMA journal_mode=DELETE")
+        self.create_table()
+
+    def create_table(self):
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS leases (
+                id INTEGER PRIMARY KEY,
+                url TEXT NOT NULL UNIQUE,
+                title TEXT,
+                status TEXT NOT NULL DEFAULT 'pending',
+                worker TEXT,
+                expires_at REAL,
+                attempts INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+
+    def add_entries(self, entries):
+        """Adds (url, title) pairs; entries already in the table are kept as is."""
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = self.conn.executemany(
+                "INSERT OR IGNORE INTO leases (url, title) VALUES (?, ?)", entries
+            )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return cursor.rowcount
+
+    def claim(self, worker, lease_seconds):
+        """Leases the next pending or expired entry as (id, url, title), or None."""
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Expired leases that ran out of attempts are given up on
+            self.conn.execute(
+                """
+                UPDATE leases SET status = 'failed', worker = NULL
+                WHERE status = 'leased' AND expires_at < ? AND attempts >= ?
+                """,
+                (now, self.max_attempts),
+            )
+            row = self.conn.execute(
+                """
+                SELECT id, url, title FROM leases
+                WHERE status = 'pending' OR (status = 'leased' AND expires_at < ?)
+                ORDER BY id LIMIT 1
+                """,
+                (now,),
+            ).fetchone()
+            if row is not None:
+                self.conn.execute(
+                    """
+                    UPDATE leases
+                    SET status = 'leased', worker = ?, expires_at = ?,
+                        attempts = attempts + 1
+                    WHERE id = ?
+                    """,
+                    (worker, now + lease_seconds, row[0]),
+                )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return row
+
+    def renew(self, lease_id, worker, lease_seconds):
+        """Extends a lease; returns False if the worker no longer holds it."""
+        cursor = self.conn.execute(
+            """
+            UPDATE leases SET expires_at = ?
+            WHERE id = ? AND worker = ? AND status = 'leased'
+            """,
+            (time.time() + lease_seconds, lease_id, worker),
+        )
+        return cursor.rowcount == 1
+
+    def complete(self, lease_id, worker):
+        """Marks a leased entry as downloaded."""
+        cursor = self.conn.execute(
+            """
+            UPDATE leases SET status = 'done', expires_at = NULL
+            WHERE id = ? AND worker = ? AND status = 'leased'
+            """,
+            (lease_id, worker),
+        )
+        return cursor.rowcount == 1
+
+    def release(self, lease_id, worker, count_attempt=True):
+        """
+        Gives a failed entry back, or marks it failed after max_attempts.
+        With count_attempt=False the attempt is not held against the entry.
+        """
+        uncounted = 0 if count_attempt else 1
+        cursor = self.conn.execute(
+            """
+            UPDATE leases
+            SET status = CASE WHEN attempts - ? >= ? THEN 'failed' ELSE 'pending' END,
+                attempts = attempts - ?, worker = NULL, expires_at = NULL
+            WHERE id = ? AND worker = ? AND status = 'leased'
+            """,
+            (uncounted, self.max_attempts, uncounted, lease_id, worker),
+        )
+        return cursor.rowcount == 1
+
+    def counts(self):
+        """Returns a {status: number of entries} dict."""
+        cursor = self.conn.execute(
+            "SELECT status, COUNT(*) FROM leases GROUP BY status"
+        )
+        return dict(cursor.fetchall())
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,97 @@
+import os
+import re
+import threading
+
+from RenamerWorker import apply_templates
+
+# YouTube Music auto-generated channels are named "<Artist> - Topic"
+TOPIC_SUFFIX = " - Topic"
+
+
+class LibraryIndex:
+    """
+    Index of normalized track names found in the music library.
+
+    Names are cleaned with the same regex templates as the renamer, so files
+    renamed by RenamerWorker or downloaded by other tools still match the
+    playlist entries yt-dlp reports.
+    """
+
+    def __init__(self, directory, templates):
+        self.directory = directory
+        self.templates = list(templates)
+        self.lock = threading.Lock()
+        self.keys = {}  # filename -> normalized key
+        self.counts = {}  # normalized key -> number of files
+
+    def normalize(self, name):
+        """Builds a comparison key: templates applied, case and punctuation dropped."""
+        cleaned_name = apply_templates(name, self.templates)
+        return re.sub(r"[\W_]+", "", cleaned_name.casefold())
+
+    def set_templates(self, templates):
+        """Replaces the templates; all keys are rebuilt on the next sync."""
+        templates = list(templates)
+        with self.lock:
+            if templates != self.templates:
+                self.templates = templates
+                self.keys.clear()
+                self.counts.clear()
+
+    def sync(self):
+        """Brings the index up to date, cleaning only files not seen before."""
+        filenames = {
+            entry.name
+            for entry in os.scandir(self.directory)
+            if entry.is_file()
+        }
+        with self.lock:
+            for filename in set(self.keys) - filenames:
+                self._discard(filename)
+            for filename in filenames - set(self.keys):
+                self._add(filename)
+
+    def add(self, file_path):
+        """Adds a newly written file to the index."""
+        with self.lock:
+            self._add(os.path.basename(file_path))
+
+    def _add(self, filename):
+        if filename in self.keys:
+            return
+        key = self.normalize(os.path.splitext(filename)[0])
+        if key:
+            self.keys[filename] = key
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def _discard(self, filename):
+        key = self.keys.pop(filename, None)
+        if key is None:
+            return
+        self.counts[key] -= 1
+        if not self.counts[key]:
+            del self.counts[key]
+
+    def candidate_names(self, info):
+        """Possible library names for a (possibly flat-extracted) yt-dlp entry."""
+        title = info.get("track") or info.get("title")
+        if not title:
+            return []
+        artist = info.get("artist") or info.get("uploader") or info.get("channel")
+        if artist and artist.endswith(TOPIC_SUFFIX):
+            artist = artist[: -len(TOPIC_SUFFIX)]
+        # The bare title is only used when there is no artist, otherwise any
+        # unrelated file named e.g. "Intro" would match
+        return [f"{artist} - {title}"] if artist else [title]
+
+    def find(self, info):
+        """Returns the matched key if the entry probably exists, otherwise None."""
+        with self.lock:
+            for name in self.candidate_names(info):
+                key = self.normalize(name)
+                if key and key in self.counts:
+                    return key
+        return None
+
+    def __len__(self):
+        return len(self.keys)
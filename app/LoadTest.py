@@ -0,0 +1,302 @@
+"""
+Offline load test for the download pipeline.
+
+Serves synthetic audio from a local HTTP server and resolves playlists with
+fake yt-dlp extractors, then drives the real DownloaderWorker (download and
+ffmpeg post-processing) and RenamerWorker against it. No network access is
+needed; only ffmpeg must be in PATH.
+
+    python app/LoadTest.py --tracks 50 --latency 0.2 --bandwidth 2000000
+"""
+
+import argparse
+import math
+import os
+import random
+import struct
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from DownloaderWorker import DownloaderWorker
+from LogConfig import process_log_file, setup_logging
+from PySide6.QtCore import QCoreApplication
+from RenamerWorker import RenamerWorker
+from TemplateDatabase import TemplateDatabase
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PLAYLIST_URL = "loadtest://playlist"
+SAMPLE_RATE = 44100
+
+
+def synthetic_wav(seconds, frequency=441):
+    """Builds a mono 16-bit WAV file containing a sine tone."""
+    period = SAMPLE_RATE // frequency
+    cycle = b"".join(
+        struct.pack("<h", int(12000 * math.sin(2 * math.pi * i / period)))
+        for i in range(period)
+    )
+    samples = cycle * (int(seconds * SAMPLE_RATE) // period)
+    header = struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF",
+        36 + len(samples),
+        b"WAVE",
+        b"fmt ",
+        16,
+        1,  # PCM
+        1,  # mono
+        SAMPLE_RATE,
+        SAMPLE_RATE * 2,
+        2,
+        16,
+        b"data",
+        len(samples),
+    )
+    return header + samples
+
+
+class AudioRequestHandler(BaseHTTPRequestHandler):
+    """Serves the synthetic track, simulating latency, bandwidth and errors."""
+
+    def do_GET(self):
+        server = self.server
+        time.sleep(server.latency)
+
+        roll = server.roll()
+        if roll < server.rate_limit_rate:
+            server.count("rate_limited")
+            self.send_error(429, "Too Many Requests")
+            return
+        if roll < server.rate_limit_rate + server.error_rate:
+            server.count("errors")
+            self.send_error(503, "Service Unavailable")
+            return
+
+        server.count("served")
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/wav")
+        self.send_header("Content-Length", str(len(server.audio)))
+        self.end_headers()
+
+        chunk_size = 64 * 1024
+        for start in range(0, len(server.audio), chunk_size):
+            chunk = server.audio[start : start + chunk_size]
+            self.wfile.write(chunk)
+            if server.bandwidth:
+                time.sleep(len(chunk) / server.bandwidth)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class AudioServer(ThreadingHTTPServer):
+    """Local stand-in for the media host."""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        audio,
+        latency=0.0,
+        bandwidth=0,
+        error_rate=0.0,
+        rate_limit_rate=0.0,
+        seed=0,
+    ):
+        super().__init__(("127.0.0.1", 0), AudioRequestHandler)
+        self.audio = audio
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"served": 0, "errors": 0, "rate_limited": 0}
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def roll(self):
+        with self.lock:
+            return self.random.random()
+
+    def count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+
+def build_extractors(server, track_count):
+    """Creates fake playlist and track extractors pointing at the server."""
+    from yt_dlp.extractor.common import InfoExtractor
+
+    class FakePlaylistIE(InfoExtractor):
+        IE_NAME = "loadtest:playlist"
+        _VALID_URL = r"loadtest://playlist"
+
+        def _real_extract(self, url):
+            entries = [
+                self.url_result(
+                    f"loadtest://track/{i}",
+                    FakeTrackIE.ie_key(),
+                    video_id=f"track{i}",
+                    # Messy titles so the rename templates have work to do
+                    video_title=f"Artist {i % 7}_-_Track {i} (Official Video)",
+                    uploader=f"Artist {i % 7}",
+                )
+                for i in range(track_count)
+            ]
+            return self.playlist_result(entries, "loadtest", "Load test playlist")
+
+    class FakeTrackIE(InfoExtractor):
+        IE_NAME = "loadtest:track"
+        _VALID_URL = r"loadtest://track/(?P<id>\d+)"
+
+        def _real_extract(self, url):
+            number = self._match_id(url)
+            return {
+                "id": f"track{number}",
+                "title": f"Artist {int(number) % 7}_-_Track {number} (Official Video)",
+                "uploader": f"Artist {int(number) % 7}",
+                "formats": [
+                    {
+                        "format_id": "wav",
+                        "url": f"{server.url}/track/{number}.wav",
+                        "ext": "wav",
+                        "acodec": "pcm_s16le",
+                        "vcodec": "none",
+                    }
+                ],
+            }
+
+    return [FakePlaylistIE(), FakeTrackIE()]
+
+
+class LoadTestDownloaderWorker(DownloaderWorker):
+    """DownloaderWorker that only knows the fake extractors."""
+
+    def __init__(self, extractors, output_dir, formats, sleep):
+        super().__init__(PLAYLIST_URL, output_dir, formats=formats)
+        self.extractors = extractors
+        self.sleep = sleep
+
+    def create_downloader(self, ydl_opts):
+        import yt_dlp
+
+        ydl_opts["sleep_interval"] = self.sleep
+        ydl_opts["max_sleep_interval"] = self.sleep
+        ydl_opts.pop("cookies_from_browser", None)
+        # auto_init=False skips the default extractors, so nothing can reach
+        # the network
+        ydl = yt_dlp.YoutubeDL(ydl_opts, auto_init=False)
+        for extractor in self.extractors:
+            ydl.add_info_extractor(extractor)
+        return ydl
+
+
+def resource_usage():
+    """Returns (cpu seconds, peak RSS MB, peak child RSS MB) for this process."""
+    if resource is None:
+        return time.process_time(), None, None
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+    return cpu, own.ru_maxrss / scale, children.ru_maxrss / scale
+
+
+def run_load_test(args):
+    app = QCoreApplication.instance() or QCoreApplication(sys.argv)
+    log_file = process_log_file()
+    setup_logging(log_file)
+
+    server = AudioServer(
+        synthetic_wav(args.duration),
+        latency=args.latency,
+        bandwidth=args.bandwidth,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit,
+        seed=args.seed,
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    output_dir = args.output or tempfile.mkdtemp(prefix="yt-loadtest-")
+    results = {"success": 0, "fail": 0}
+
+    worker = LoadTestDownloaderWorker(
+        build_extractors(server, args.tracks), output_dir, args.formats, args.sleep
+    )
+
+    def count(key):
+        def handler(_filename):
+            results[key] += 1
+
+        return handler
+
+    worker.track_success.connect(count("success"))
+    worker.track_fail.connect(count("fail"))
+    worker.error.connect(print)
+
+    cpu_start = resource_usage()[0]
+    started = time.perf_counter()
+    worker.run()
+    download_time = time.perf_counter() - started
+    # With several formats, tracks are reported from the encoder's threads;
+    # those signals are queued to this thread and delivered here
+    app.processEvents()
+
+    # Rename pipeline on the first format's folder
+    db = TemplateDatabase(":memory:")
+    db.add_default_templates()
+    renamer = RenamerWorker([(t[1], t[2]) for t in db.get_all_templates()])
+    rename_dir = output_dir
+    if len(args.formats) > 1:
+        rename_dir = os.path.join(output_dir, args.formats[0])
+    scanned = []
+    renamer.scan_complete.connect(scanned.extend)
+    rename_started = time.perf_counter()
+    renamer.scan_directory(rename_dir)
+    renamer.rename_files(rename_dir, scanned)
+    rename_time = time.perf_counter() - rename_started
+    db.close()
+
+    total_time = time.perf_counter() - started
+    cpu, peak_rss, peak_child_rss = resource_usage()
+    server.shutdown()
+
+    print(f"Output:          {output_dir}")
+    print(f"Log:             {log_file}")
+    print(f"Tracks:          {results['success']} ok, {results['fail']} failed")
+    print(f"Server:          {server.stats}")
+    print(f"Download time:   {download_time:.1f} s")
+    print(f"Rename time:     {rename_time:.2f} s ({len(scanned)} files)")
+    print(f"Throughput:      {results['success'] / (total_time / 60):.1f} tracks/min")
+    print(f"CPU time:        {cpu - cpu_start:.1f} s (incl. ffmpeg)")
+    if peak_rss is not None:
+        print(f"Peak memory:     {peak_rss:.0f} MB (ffmpeg {peak_child_rss:.0f} MB)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tracks", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=30, help="audio seconds")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds/request")
+    parser.add_argument("--bandwidth", type=int, default=0, help="bytes/s, 0 = off")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of 503s")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="share of 429s")
+    parser.add_argument("--sleep", type=float, default=0, help="yt-dlp sleep_interval")
+    parser.add_argument("--formats", nargs="+", default=["m4a"])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="output folder (default: temporary)")
+    run_load_test(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_FILE = "download_errors.log"
+MAX_LOG_BYTES = 10 * 1024 * 1024
+LOG_BACKUPS = 5
+
+# Per-module levels, overridable with e.g. LOG_LEVELS="yt_dlp=DEBUG,TaskExecutor=INFO"
+LOG_LEVELS = {
+    "": "INFO",
+    "yt_dlp": "WARNING",
+}
+
+# Fields passed with extra={...} that are copied into the JSON line
+STRUCTURED_FIELDS = ("track_id", "stage", "duration", "size", "job_id")
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as one JSON object per line."""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in STRUCTURED_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        exception = getattr(record, "exception", None)
+        if exception is None and record.exc_info:
+            exception = self.formatException(record.exc_info)
+        if exception:
+            entry["exception"] = exception
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class StructuredQueueHandler(QueueHandler):
+    """
+    QueueHandler that keeps the traceback in its own attribute.
+
+    The default prepare() folds the traceback into the message and drops
+    exc_info before the record reaches the listener thread.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exception = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        record.exc_text = None
+        return record
+
+
+def parse_levels(value):
+    """Parses "module=LEVEL,module=LEVEL" into a dict, skipping unknown levels."""
+    levels = {}
+    for item in value.split(","):
+        name, _, level = item.partition("=")
+        level = level.strip().upper()
+        if not level:
+            continue
+        # Runs at startup, so a typo must not keep the app from starting
+        if not isinstance(logging.getLevelName(level), int):
+            print(f"Ignoring unknown log level: {item.strip()}", file=sys.stderr)
+            continue
+        levels[name.strip()] = level
+    return levels
+
+
+def process_log_file():
+    """Log file for one of several worker processes; handlers cannot be shared."""
+    name, ext = os.path.splitext(LOG_FILE)
+    return f"{name}.{os.getpid()}{ext}"
+
+
+def setup_logging(log_file=LOG_FILE):
+    """
+    Routes all logging through a queue to a background writer thread.
+
+    Worker threads only put records on the queue, so a slow disk never stalls
+    a download. The file is rotated once it reaches MAX_LOG_BYTES.
+    """
+    file_handler = RotatingFileHandler(
+        log_file, maxBytes=MAX_LOG_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8"
+    )
+    file_handler.setFormatter(JsonFormatter())
+
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    root = logging.getLogger()
+    root.handlers.clear()
+    root.addHandler(StructuredQueueHandler(log_queue))
+
+    levels = {**LOG_LEVELS, **parse_levels(os.environ.get("LOG_LEVELS", ""))}
+    for name, level in levels.items():
+        logging.getLogger(name or None).setLevel(level)
+
+    return listener
@@ -1,8 +1,11 @@
 import os
+import time
 from pathlib import Path
 
+from AudioEncoder import CODEC_ARGS
 from DownloaderWorker import DownloaderWorker
-from PySide6.QtCore import Qt, QThread
+from LibraryIndex import LibraryIndex
+from PySide6.QtCore import Qt, QTimer
 from PySide6.QtGui import QAction
 from PySide6.QtWidgets import (
     QCheckBox,
@@ -28,7 +31,9 @@ from styleSheets import (
     purpleStyleSheet,
     redStyleSheet,
 )
+from TaskExecutor import CPU_LANE, IO_LANE, TaskExecutor
 from TemplateDatabase import TemplateDatabase
+from YtdlSession import YtdlSession
 
 
 class MainWindow(QMainWindow):
@@ -45,15 +50,29 @@ class MainWindow(QMainWindow):
         self.db = TemplateDatabase()
         self.db.add_default_templates()
 
-        # Worker thread references
-        self.thread = None
-        self.worker = None
+        # Background jobs: downloads, scans and renames can run side by side
+        self.executor = TaskExecutor(self)
+        self.executor.job_started.connect(self.update_job_status)
+        self.executor.job_progress.connect(self.on_job_progress)
+        self.executor.job_finished.connect(self.on_job_finished)
+        self.download_job = None
+        self.scan_job = None
+        self.rename_job = None
+
+        # Normalized names of files already in the output folder
+        self.library_index = None
+
+        # yt-dlp instance kept warm between downloads
+        self.ytdl_session = YtdlSession()
 
         self.default_music_dir.mkdir(parents=True, exist_ok=True)
 
         # Build the UI
         self.setup_ui()
 
+        # Import yt-dlp and set up extractors once the window is shown
+        QTimer.singleShot(0, self.warm_up_session)
+
     # ---------------------------------------------------------------------
     # UI Construction
     # ---------------------------------------------------------------------
@@ -104,11 +123,35 @@ class MainWindow(QMainWindow):
         dir_layout.addWidget(self.browse_btn)
         layout.addLayout(dir_layout)
 
+        # Output formats; several formats are encoded from a single download
+        formats_layout = QHBoxLayout()
+        formats_layout.addWidget(QLabel("Formats:"))
+        self.format_checkboxes = {}
+        for fmt in CODEC_ARGS:
+            checkbox = QCheckBox(fmt)
+            checkbox.setChecked(fmt == "m4a")
+            formats_layout.addWidget(checkbox)
+            self.format_checkboxes[fmt] = checkbox
+        formats_layout.addStretch()
+        layout.addLayout(formats_layout)
+
+        # Skip tracks that already exist under a cleaned name
+        self.skip_existing_checkbox = QCheckBox("Skip tracks already in library")
+        self.skip_existing_checkbox.setChecked(True)
+        layout.addWidget(self.skip_existing_checkbox)
+
         # Start download button
         self.start_download_btn = QPushButton("Start Download")
         self.start_download_btn.setStyleSheet(purpleStyleSheet)
         self.start_download_btn.clicked.connect(self.start_download)
-        layout.addWidget(self.start_download_btn)
+        self.stop_download_btn = QPushButton("Stop Download")
+        self.stop_download_btn.setStyleSheet(redStyleSheet)
+        self.stop_download_btn.setEnabled(False)
+        self.stop_download_btn.clicked.connect(self.stop_download)
+        download_btn_layout = QHBoxLayout()
+        download_btn_layout.addWidget(self.start_download_btn)
+        download_btn_layout.addWidget(self.stop_download_btn)
+        layout.addLayout(download_btn_layout)
 
         # Counters
         counters_layout = QHBoxLayout()
@@ -343,42 +386,87 @@ class MainWindow(QMainWindow):
         if directory:
             self.output_dir_input.setText(directory)
 
+    def selected_formats(self):
+        return [
+            fmt
+            for fmt, checkbox in self.format_checkboxes.items()
+            if checkbox.isChecked()
+        ]
+
+    def warm_up_session(self):
+        """Build the yt-dlp session in the background with the current settings."""
+        formats = self.selected_formats() or ["m4a"]
+        worker = DownloaderWorker(
+            "", self.output_dir_input.text(), formats=formats, session=self.ytdl_session
+        )
+        worker.error.connect(self.update_download_log)
+        self.executor.submit(worker, worker.warm_up, lane=IO_LANE)
+
     def start_download(self):
+        started_at = time.perf_counter()
         url = self.url_input.text()
         output_dir = self.output_dir_input.text()
+        formats = self.selected_formats()
 
         if not url:
             self.download_log.append("⛔ Please enter a playlist URL.")
             return
+        if not formats:
+            self.download_log.append("⛔ Please select at least one format.")
+            return
 
         os.makedirs(output_dir, exist_ok=True)
 
         # Reset UI state and counters
         self.start_download_btn.setEnabled(False)
+        self.stop_download_btn.setEnabled(True)
         self.download_log.clear()
         self.success_count = 0
         self.fail_count = 0
         self.success_label.setText("Success: 0")
         self.fail_label.setText("Failed: 0")
 
-        # Configure worker thread
-        self.thread = QThread()
-        self.worker = DownloaderWorker(url, output_dir)
-        self.worker.moveToThread(self.thread)
+        library_index = None
+        if self.skip_existing_checkbox.isChecked():
+            # With several formats, each one has its own tree; the first is checked
+            library_dir = output_dir
+            if len(formats) > 1:
+                library_dir = os.path.join(output_dir, formats[0])
+                os.makedirs(library_dir, exist_ok=True)
+            library_index = self.get_library_index(library_dir)
+
+        worker = DownloaderWorker(
+            url,
+            output_dir,
+            library_index,
+            formats,
+            session=self.ytdl_session,
+            started_at=started_at,
+        )
 
         # Signal wiring
-        self.thread.started.connect(self.worker.run)
-        self.worker.finished.connect(self.thread.quit)
-        self.worker.finished.connect(self.worker.deleteLater)
-        self.thread.finished.connect(self.thread.deleteLater)
-        self.thread.finished.connect(lambda: self.start_download_btn.setEnabled(True))
+        worker.progress.connect(self.update_download_log)
+        worker.error.connect(self.update_download_log)
+        worker.track_success.connect(self.increment_success)
+        worker.track_fail.connect(self.increment_fail)
 
-        self.worker.progress.connect(self.update_download_log)
-        self.worker.error.connect(self.update_download_log)
-        self.worker.track_success.connect(self.increment_success)
-        self.worker.track_fail.connect(self.increment_fail)
+        self.download_job = self.executor.submit(
+            worker, worker.run, lane=IO_LANE, progress=worker.progress
+        )
+
+    def stop_download(self):
+        if self.download_job is not None:
+            self.executor.cancel(self.download_job)
+            self.stop_download_btn.setEnabled(False)
 
-        self.thread.start()
+    def get_library_index(self, directory):
+        """Return the library index for the folder, reusing it between runs."""
+        templates = [(t[1], t[2]) for t in self.db.get_all_templates()]
+        if self.library_index is None or self.library_index.directory != directory:
+            self.library_index = LibraryIndex(directory, templates)
+        else:
+            self.library_index.set_templates(templates)
+        return self.library_index
 
     def update_download_log(self, message):
         self.download_log.append(message)
@@ -408,25 +496,27 @@ class MainWindow(QMainWindow):
             # Could show an error message here
             return
 
-        templates = [(t[1], t[2]) for t in self.db.get_all_templates()]
+        # Only the latest scan matters for the table
+        if self.scan_job is not None:
+            self.executor.cancel(self.scan_job)
 
-        self.thread = QThread()
-        self.worker = RenamerWorker(templates)
-        self.worker.moveToThread(self.thread)
+        templates = [(t[1], t[2]) for t in self.db.get_all_templates()]
 
-        self.thread.started.connect(lambda: self.worker.scan_directory(directory))
-        self.worker.scan_complete.connect(self.populate_rename_table)
-        self.worker.error.connect(
+        worker = RenamerWorker(templates)
+        worker.scan_complete.connect(self.populate_rename_table)
+        worker.error.connect(
             lambda err: self.download_log.append(f"Rename error: {err}")
         )
-        self.worker.scan_complete.connect(self.thread.quit)
-        self.worker.scan_complete.connect(self.worker.deleteLater)
-        self.thread.finished.connect(self.thread.deleteLater)
 
-        self.thread.start()
+        # Applying regex templates to every file name is CPU-bound
+        self.scan_job = self.executor.submit(
+            worker, worker.scan_directory, directory, lane=CPU_LANE
+        )
 
     def populate_rename_table(self, files):
         """Populate the table with (old_name, new_name) pairs returned from the scan."""
+        if self.sender() is not None and not self.sender().is_running:
+            return  # Results of a cancelled scan
 
         if not files:
             self.rename_table.hide()
@@ -473,47 +563,72 @@ class MainWindow(QMainWindow):
 
         templates = [(t[1], t[2]) for t in self.db.get_all_templates()]
 
-        self.thread = QThread()
-        self.worker = RenamerWorker(templates)
-        self.worker.moveToThread(self.thread)
+        self.rename_btn.setEnabled(False)
 
-        self.thread.started.connect(
-            lambda: self.worker.rename_files(directory, files_to_rename)
-        )
-        self.worker.rename_progress.connect(
+        worker = RenamerWorker(templates)
+        worker.rename_progress.connect(
             self.update_download_log
         )  # Reuse the same log widget
-        self.worker.rename_finished.connect(self.on_rename_finished)
-
-        self.worker.rename_finished.connect(self.thread.quit)
-        self.worker.rename_finished.connect(self.worker.deleteLater)
-        self.thread.finished.connect(self.thread.deleteLater)
-
-        self.thread.start()
+        worker.rename_finished.connect(self.on_rename_finished)
+        worker.error.connect(self.update_download_log)
+
+        self.rename_job = self.executor.submit(
+            worker,
+            worker.rename_files,
+            directory,
+            files_to_rename,
+            lane=IO_LANE,
+            progress=worker.rename_progress,
+        )
 
     def on_rename_finished(self):
         self.update_download_log("✔️ Renaming finished.")
         # Refresh the table after renaming
-        self.thread.quit()
-        self.thread.wait()
         self.scan_for_rename()
 
+    # ------------------------------------------------------------------
+    # Background jobs
+    # ------------------------------------------------------------------
+    def update_job_status(self, _job_id=None):
+        count = self.executor.active_count()
+        if count:
+            self.statusBar().showMessage(f"Background jobs running: {count}")
+        else:
+            self.statusBar().clearMessage()
+
+    def on_job_progress(self, job_id, message):
+        count = self.executor.active_count()
+        self.statusBar().showMessage(f"[{count} running] Job {job_id}: {message}")
+        # Download and rename jobs already write their messages to the log
+        if job_id not in (self.download_job, self.rename_job):
+            self.download_log.append(message)
+
+    def on_job_finished(self, job_id):
+        if job_id == self.download_job:
+            self.download_job = None
+            self.start_download_btn.setEnabled(True)
+            self.stop_download_btn.setEnabled(False)
+        elif job_id == self.scan_job:
+            self.scan_job = None
+        elif job_id == self.rename_job:
+            self.rename_job = None
+            self.rename_btn.setEnabled(True)
+        self.update_job_status()
+
     # ------------------------------------------------------------------
     # Shutdown handling
     # ------------------------------------------------------------------
     def closeEvent(self, event):
-        """Ensure worker threads shut down cleanly when the window closes."""
-        if self.worker:
-            self.worker.is_running = False
-
-        # Wait up to 5 seconds for the thread to finish
-        if self.thread and self.thread.isRunning():
+        """Ensure background jobs shut down cleanly when the window closes."""
+        # Cancel all jobs and wait up to 5 seconds for them to finish
+        if self.executor.active_count():
             self.download_log.append("Finishing background tasks…")
-            if not self.thread.wait(5000):
-                self.download_log.append(
-                    "⚠️ Thread did not respond in time. Possible issue on shutdown."
-                )
+        if not self.executor.shutdown(5000):
+            self.download_log.append(
+                "⚠️ Jobs did not respond in time. Possible issue on shutdown."
+            )
 
-        # Close DB connection
+        # Close the yt-dlp session and DB connection
+        self.ytdl_session.close()
         self.db.close()
         event.accept()
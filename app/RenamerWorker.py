@@ -4,6 +4,16 @@ import re
 from PySide6.QtCore import QObject, Signal
 
 
+def apply_templates(name, templates):
+    """Applies (pattern, replacement) regex templates to a file name."""
+    cleaned_name = name
+    for pattern, replacement in templates:
+        cleaned_name = re.sub(pattern, replacement, cleaned_name, flags=re.IGNORECASE)
+
+    # Remove trailing spaces, dashes or underscores
+    return cleaned_name.strip(" -_")
+
+
 class RenamerWorker(QObject):
     """
     Worker class for scanning directories and renaming files after downloading.
@@ -17,12 +27,15 @@ class RenamerWorker(QObject):
     def __init__(self, templates):
         super().__init__()
         self.templates = templates
+        self.is_running = True
 
     def scan_directory(self, directory):
         """Scans the directory and builds a list of files that need renaming."""
         results = []
         try:
             for filename in os.listdir(directory):
+                if not self.is_running:
+                    break
                 if os.path.isfile(os.path.join(directory, filename)):
                     name_without_ext, file_ext = os.path.splitext(filename)
                     cleaned_name = self.clean_filename(name_without_ext)
@@ -37,20 +50,15 @@ class RenamerWorker(QObject):
 
     def clean_filename(self, name):
         """Applies regex templates to clean up a file name."""
-        cleaned_name = name
-        for pattern, replacement in self.templates:
-            cleaned_name = re.sub(
-                pattern, replacement, cleaned_name, flags=re.IGNORECASE
-            )
-
-        # Remove trailing spaces, dashes or underscores
-        cleaned_name = cleaned_name.strip(" -_")
-        return cleaned_name
+        return apply_templates(name, self.templates)
 
     def rename_files(self, directory, files_to_rename):
         """Renames the selected files."""
         try:
             for old_name, new_name in files_to_rename:
+                if not self.is_running:
+                    self.rename_progress.emit("⛔ Renaming stopped by user.")
+                    break
                 old_path = os.path.join(directory, old_name)
                 new_path = os.path.join(directory, new_name)
                 try:
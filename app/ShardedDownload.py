@@ -0,0 +1,178 @@
+"""
+Sharded playlist downloading across several processes or hosts.
+
+The coordinator resolves the playlist once and stores its entries in a shared
+SQLite lease table. Workers lease entries one by one, renew their lease while
+downloading and mark it done, so each track is downloaded exactly once.
+
+    python app/ShardedDownload.py coordinate --db leases.db <playlist URL>
+    python app/ShardedDownload.py work --db leases.db --output <folder> --processes 4
+    python app/ShardedDownload.py status --db leases.db
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+import socket
+import sys
+import threading
+
+from DownloaderWorker import DownloaderWorker
+from LeaseTable import LeaseTable
+from LogConfig import process_log_file, setup_logging
+from PySide6.QtCore import QCoreApplication
+from YtdlSession import YtdlSession
+
+logger = logging.getLogger(__name__)
+
+
+def resolve_playlist(url):
+    """Returns (url, title) pairs of the playlist entries without downloading."""
+    import yt_dlp
+
+    # The workers' options, so cookies give access to the same private and
+    # account-only playlists; ffmpeg is not needed for resolving
+    ydl_opts = DownloaderWorker(url, ".").build_ydl_opts(ffmpeg_path=None)
+    ydl_opts["extract_flat"] = "in_playlist"
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(url, download=False)
+    if not info:
+        return []
+    entries = info.get("entries") or [info]
+    return [
+        (entry.get("url") or entry.get("webpage_url"), entry.get("title"))
+        for entry in entries
+        if entry and (entry.get("url") or entry.get("webpage_url"))
+    ]
+
+
+class Heartbeat(threading.Thread):
+    """Renews a lease in the background until stopped; stops the download if lost."""
+
+    def __init__(self, db_file, lease_id, worker_id, lease_seconds, downloader):
+        super().__init__(daemon=True)
+        self.db_file = db_file
+        self.lease_id = lease_id
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.downloader = downloader
+        self.stopped = threading.Event()
+        self.lost = False
+
+    def run(self):
+        # SQLite connections cannot be shared between threads
+        table = LeaseTable(self.db_file)
+        try:
+            while not self.stopped.wait(self.lease_seconds / 3):
+                if not table.renew(self.lease_id, self.worker_id, self.lease_seconds):
+                    logger.error(f"Lease {self.lease_id} lost by {self.worker_id}")
+                    self.lost = True
+                    # Another worker may own the entry now
+                    self.downloader.is_running = False
+                    return
+        finally:
+            table.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def make_downloader(url, output_dir, session):
+    """Creates the DownloaderWorker for one entry; succeeded lists its files."""
+    worker = DownloaderWorker(url, output_dir, session=session)
+    worker.succeeded = []
+    worker.track_success.connect(worker.succeeded.append)
+    worker.progress.connect(print)
+    worker.error.connect(print)
+    return worker
+
+
+def work(db_file, output_dir, lease_seconds):
+    """Leases and downloads entries until none are left."""
+    app = QCoreApplication.instance() or QCoreApplication(sys.argv)  # noqa: F841
+    setup_logging(process_log_file())
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    table = LeaseTable(db_file)
+    # One warm yt-dlp instance for all entries of this process
+    session = YtdlSession()
+    try:
+        while True:
+            lease = table.claim(worker_id, lease_seconds)
+            if lease is None:
+                break
+            lease_id, url, title = lease
+            print(f"[{worker_id}] Leased {title or url}")
+
+            downloader = make_downloader(url, output_dir, session)
+            heartbeat = Heartbeat(
+                db_file, lease_id, worker_id, lease_seconds, downloader
+            )
+            heartbeat.start()
+            try:
+                downloader.run()
+            finally:
+                heartbeat.stop()
+
+            if heartbeat.lost:
+                continue  # Another worker owns the entry now
+            if downloader.critical_error is not None:
+                # A problem with this node (no ffmpeg, no cookies, ...), not
+                # with the entry: hand it back untouched and stop working
+                table.release(lease_id, worker_id, count_attempt=False)
+                logger.critical(
+                    f"{worker_id} stopped: {downloader.critical_error}",
+                    extra={"stage": "setup"},
+                )
+                break
+            if downloader.succeeded:
+                table.complete(lease_id, worker_id)
+            else:
+                table.release(lease_id, worker_id)
+    finally:
+        session.close()
+        table.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    coordinate = subparsers.add_parser("coordinate", help="resolve a playlist")
+    coordinate.add_argument("url")
+    status = subparsers.add_parser("status", help="show lease counts")
+    worker = subparsers.add_parser("work", help="download leased entries")
+    worker.add_argument("--output", required=True)
+    worker.add_argument("--processes", type=int, default=1)
+    worker.add_argument("--lease-seconds", type=float, default=300)
+    for subparser in (coordinate, status, worker):
+        subparser.add_argument("--db", default="leases.db")
+
+    args = parser.parse_args()
+
+    if args.command == "coordinate":
+        table = LeaseTable(args.db)
+        added = table.add_entries(resolve_playlist(args.url))
+        print(f"Added {added} entries, table: {table.counts()}")
+        table.close()
+    elif args.command == "status":
+        table = LeaseTable(args.db)
+        print(table.counts())
+        table.close()
+    else:
+        os.makedirs(args.output, exist_ok=True)
+        processes = [
+            multiprocessing.Process(
+                target=work, args=(args.db, args.output, args.lease_seconds)
+            )
+            for _ in range(args.processes)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+
+
+if __name__ == "__main__":
+    main()
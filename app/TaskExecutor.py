@@ -0,0 +1,119 @@
+import itertools
+import logging
+import time
+from functools import partial
+
+from PySide6.QtCore import QObject, QRunnable, QThread, QThreadPool, Signal
+
+IO_LANE = "io"
+CPU_LANE = "cpu"
+
+logger = logging.getLogger(__name__)
+
+
+class Job(QRunnable):
+    """
+    A single unit of work submitted to the executor.
+    """
+
+    def __init__(self, executor, job_id, lane, worker, method, args):
+        super().__init__()
+        # The executor keeps the reference, Qt must not delete the job after
+        # run() while cancel() may still call tryTake() on it
+        self.setAutoDelete(False)
+        self.executor = executor
+        self.job_id = job_id
+        self.lane = lane
+        self.worker = worker
+        self.method = method
+        self.args = args
+
+    def cancel(self):
+        """Asks the worker to stop; workers poll their is_running flag."""
+        if hasattr(self.worker, "is_running"):
+            self.worker.is_running = False
+
+    def run(self):
+        self.executor.job_started.emit(self.job_id)
+        try:
+            self.method(*self.args)
+        except Exception as e:
+            logger.exception(
+                f"Job {self.job_id} failed: {e}", extra={"job_id": self.job_id}
+            )
+            self.executor.job_progress.emit(self.job_id, f"⛔ Job failed: {e}")
+        finally:
+            # Queued to the executor's thread, so the job is released there
+            self.executor.job_done.emit(self.job_id)
+
+
+class TaskExecutor(QObject):
+    """
+    Long-lived executor for background work, owned by the main window.
+
+    Jobs run on one of two thread pools: the I/O lane for downloads and file
+    operations, and the CPU lane for work such as applying regex templates.
+    Each job gets an ID that can be used to follow its progress or cancel it.
+    """
+
+    job_started = Signal(int)
+    job_progress = Signal(int, str)
+    job_finished = Signal(int)
+    job_done = Signal(int)
+
+    def __init__(self, parent=None, io_threads=4):
+        super().__init__(parent)
+        self.job_done.connect(self.finish_job)
+        self.lanes = {
+            IO_LANE: QThreadPool(self),
+            CPU_LANE: QThreadPool(self),
+        }
+        self.lanes[IO_LANE].setMaxThreadCount(io_threads)
+        self.lanes[CPU_LANE].setMaxThreadCount(QThread.idealThreadCount())
+        self.jobs = {}
+        self.job_ids = itertools.count(1)
+
+    def submit(self, worker, method, *args, lane=IO_LANE, progress=None):
+        """
+        Queues worker.method(*args) on the given lane and returns the job ID.
+        If a progress signal is given, its messages are forwarded as job_progress.
+        """
+        job_id = next(self.job_ids)
+        job = Job(self, job_id, lane, worker, method, args)
+        if progress is not None:
+            progress.connect(partial(self.job_progress.emit, job_id))
+        self.jobs[job_id] = job
+        self.lanes[lane].start(job)
+        return job_id
+
+    def cancel(self, job_id):
+        """Cancels a job: queued jobs are dropped, running ones asked to stop."""
+        job = self.jobs.get(job_id)
+        if job is None:
+            return
+        if self.lanes[job.lane].tryTake(job):
+            self.finish_job(job_id)
+        else:
+            job.cancel()
+
+    def finish_job(self, job_id):
+        if self.jobs.pop(job_id, None) is not None:
+            self.job_finished.emit(job_id)
+
+    def is_active(self, job_id):
+        return job_id in self.jobs
+
+    def active_count(self):
+        return len(self.jobs)
+
+    def shutdown(self, timeout_ms=5000):
+        """Cancels all jobs and waits for the lanes; returns False on timeout."""
+        for job_id in list(self.jobs):
+            self.cancel(job_id)
+        # One deadline for all lanes, not timeout_ms per lane
+        deadline = time.monotonic() + timeout_ms / 1000
+        done = True
+        for pool in self.lanes.values():
+            remaining_ms = max(int((deadline - time.monotonic()) * 1000), 0)
+            done = pool.waitForDone(remaining_ms) and done
+        return done
@@ -0,0 +1,163 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Per-run callbacks; they are dispatched by the session instead of being
+# part of the options the YoutubeDL instance is built from
+CALLBACK_OPTIONS = ("progress_hooks", "match_filter", "logger")
+
+
+def default_factory(ydl_opts):
+    import yt_dlp
+
+    return yt_dlp.YoutubeDL(ydl_opts)
+
+
+def make_hook_postprocessor(callback):
+    """Wraps callback(ydl, info) in a yt-dlp post-processor."""
+    from yt_dlp.postprocessor.common import PostProcessor
+
+    class HookPostProcessor(PostProcessor):
+        def run(self, info):
+            callback(self._downloader, info)
+            return [], info
+
+    return HookPostProcessor()
+
+
+class YtdlSession:
+    """
+    A YoutubeDL instance kept warm between download runs.
+
+    Importing yt-dlp, loading extractors and cookies happens once; the
+    instance is rebuilt only when the options change. Each run binds its own
+    progress hook, match filter, before-download and after-move hooks.
+    """
+
+    def __init__(self, factory=default_factory):
+        self.factory = factory
+        # Held for a whole download or warm-up
+        self.lock = threading.Lock()
+        # Guards closing; lock is only released while holding it, so close()
+        # cannot miss the end of a run
+        self.closing_lock = threading.Lock()
+        self.ydl = None
+        self.options_key = None
+        self.progress_hook = None
+        self.before_download = None
+        self.after_move = None
+        self.closing = False
+
+    @staticmethod
+    def make_key(ydl_opts):
+        return repr(
+            sorted(
+                (key, value)
+                for key, value in ydl_opts.items()
+                if key not in CALLBACK_OPTIONS
+            )
+        )
+
+    def build(self, ydl_opts):
+        """Returns the cached instance, rebuilding it if the options changed."""
+        key = self.make_key(ydl_opts)
+        if self.ydl is not None and key == self.options_key:
+            return self.ydl
+        if self.ydl is not None:
+            self.ydl.close()
+
+        started = time.perf_counter()
+        ydl_opts = {
+            key: value for key, value in ydl_opts.items() if key != "progress_hooks"
+        }
+        ydl_opts["progress_hooks"] = [self.dispatch_progress]
+        self.ydl = self.factory(ydl_opts)
+        self.ydl.add_post_processor(
+            make_hook_postprocessor(self.dispatch_before_download), when="before_dl"
+        )
+        # After yt-dlp's own fixups and the move to the final path
+        self.ydl.add_post_processor(
+            make_hook_postprocessor(self.dispatch_after_move), when="after_move"
+        )
+        self.options_key = key
+        logger.info(
+            "yt-dlp session built",
+            extra={"stage": "session", "duration": time.perf_counter() - started},
+        )
+        return self.ydl
+
+    def warm_up(self, ydl_opts):
+        """Builds the instance and initialises extractors and cookies ahead of time."""
+        self.lock.acquire()
+        try:
+            started = time.perf_counter()
+            ydl = self.build(ydl_opts)
+            for ie_key in ("Youtube", "YoutubeTab"):
+                try:
+                    ydl.get_info_extractor(ie_key)
+                except Exception:
+                    pass  # Not every downloader knows the YouTube extractors
+            ydl.cookiejar
+            logger.info(
+                "yt-dlp session warmed up",
+                extra={"stage": "session", "duration": time.perf_counter() - started},
+            )
+        finally:
+            self.release()
+
+    def download(self, urls, ydl_opts, progress_hook, before_download, after_move):
+        """Runs one download with the given per-run callbacks."""
+        self.lock.acquire()
+        try:
+            ydl = self.build(ydl_opts)
+            self.progress_hook = progress_hook
+            self.before_download = before_download
+            self.after_move = after_move
+            ydl.params["match_filter"] = ydl_opts.get("match_filter")
+            return ydl.download(urls)
+        finally:
+            self.progress_hook = None
+            self.before_download = None
+            self.after_move = None
+            self.release()
+
+    def release(self):
+        """Releases lock, first closing the instance if close() was called."""
+        with self.closing_lock:
+            if self.closing:
+                self.close_instance()
+            self.lock.release()
+
+    def prepare_filename(self, info):
+        """Path yt-dlp writes the entry to; only valid during download()."""
+        return self.ydl.prepare_filename(info)
+
+    def dispatch_progress(self, d):
+        if self.progress_hook is not None:
+            self.progress_hook(d)
+
+    def dispatch_before_download(self, ydl, info):
+        if self.before_download is not None:
+            self.before_download(ydl, info)
+
+    def dispatch_after_move(self, ydl, info):
+        if self.after_move is not None:
+            self.after_move(ydl, info)
+
+    def close(self):
+        """Closes the instance; a running download closes it when it finishes."""
+        with self.closing_lock:
+            self.closing = True
+            if not self.lock.acquire(blocking=False):
+                return
+        self.release()
+
+    def close_instance(self):
+        # Called with the lock held
+        self.closing = False
+        if self.ydl is not None:
+            self.ydl.close()
+            self.ydl = None
+            self.options_key = None
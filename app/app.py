@@ -1,18 +1,12 @@
-import logging
 import sys
 
+from LogConfig import setup_logging
 from MainWindow import MainWindow
 from PySide6.QtWidgets import (
     QApplication,
 )
 
-LOG_FILE = "download_errors.log"
-logging.basicConfig(
-    filename=LOG_FILE,
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    encoding="utf-8",
-)
+setup_logging()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,83 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from DownloadTuner import (  # noqa: E402
+    CHUNK_SECONDS,
+    MAX_CHUNK_SIZE,
+    MIN_CHUNK_SIZE,
+    DownloadTuner,
+)
+
+HOST = "googlevideo.com"
+MB = 1 << 20
+
+
+@pytest.fixture
+def tuner(tmp_path):
+    tuner = DownloadTuner(str(tmp_path / "settings.db"))
+    yield tuner
+    tuner.close()
+
+
+def step(tuner):
+    return tuner.conn.execute(
+        "SELECT step FROM download_tuning WHERE host = ?", (HOST,)
+    ).fetchone()[0]
+
+
+def test_first_record_moves_concurrency_up(tuner):
+    # 4 connections at 8 MB/s
+    tuner.record(HOST, 4, 10 * MB, 80 * MB, 10)
+
+    concurrency, chunk_size = tuner.get_settings(HOST)
+    assert concurrency == 8
+    assert chunk_size == 2 * MB * CHUNK_SECONDS
+    assert step(tuner) == 1
+
+
+def test_plateau_undoes_increase_and_settles(tuner):
+    tuner.record(HOST, 4, 10 * MB, 80 * MB, 10)
+    # Twice the connections, only 5% faster
+    tuner.record(HOST, 8, 8 * MB, 84 * MB, 10)
+
+    assert tuner.get_settings(HOST)[0] == 4
+    assert step(tuner) == 0
+
+    # Settled: stays put while throughput is within noise
+    tuner.record(HOST, 4, 8 * MB, 82 * MB, 10)
+    assert tuner.get_settings(HOST)[0] == 4
+    assert step(tuner) == 0
+
+
+def test_drop_reverses_direction(tuner):
+    tuner.record(HOST, 4, 10 * MB, 80 * MB, 10)
+    # Twice the connections, half the throughput
+    tuner.record(HOST, 8, 8 * MB, 40 * MB, 10)
+
+    assert tuner.get_settings(HOST)[0] == 4
+    assert step(tuner) == -1
+
+
+def test_chunk_size_is_clamped(tuner):
+    tuner.record(HOST, 4, 10 * MB, 1 * MB, 10)
+    assert tuner.get_settings(HOST)[1] == MIN_CHUNK_SIZE
+
+    tuner.record("example.com", 1, 10 * MB, 1000 * MB, 1)
+    assert tuner.get_settings("example.com")[1] == MAX_CHUNK_SIZE
+
+
+def test_settings_persist_across_instances(tmp_path):
+    db_file = str(tmp_path / "settings.db")
+    tuner = DownloadTuner(db_file)
+    tuner.record(HOST, 4, 10 * MB, 80 * MB, 10)
+    settings = tuner.get_settings(HOST)
+    tuner.close()
+
+    tuner = DownloadTuner(db_file)
+    assert tuner.get_settings(HOST) == settings
+    assert tuner.get_settings("unknown.com") == (4, 10 * MB)
+    tuner.close()
@@ -0,0 +1,65 @@
+import multiprocessing
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from LeaseTable import LeaseTable  # noqa: E402
+
+
+def claim_all(db_file, worker):
+    """Claims and completes entries until none are left; returns their IDs."""
+    table = LeaseTable(db_file)
+    claimed = []
+    while True:
+        lease = table.claim(worker, lease_seconds=60)
+        if lease is None:
+            break
+        claimed.append(lease[0])
+        assert table.complete(lease[0], worker)
+    table.close()
+    return claimed
+
+
+def test_concurrent_claims_across_processes(tmp_path):
+    db_file = str(tmp_path / "leases.db")
+    table = LeaseTable(db_file)
+    table.add_entries([(f"https://example.com/{i}", f"Track {i}") for i in range(200)])
+
+    with multiprocessing.Pool(4) as pool:
+        results = pool.starmap(claim_all, [(db_file, f"worker{i}") for i in range(4)])
+
+    claimed = [lease_id for result in results for lease_id in result]
+    assert len(claimed) == 200
+    assert len(set(claimed)) == 200
+    assert table.counts() == {"done": 200}
+    table.close()
+
+
+def test_expired_lease_is_claimed_again(tmp_path):
+    table = LeaseTable(str(tmp_path / "leases.db"))
+    table.add_entries([("https://example.com/1", "Track 1")])
+
+    lease_id = table.claim("dead", lease_seconds=0.01)[0]
+    time.sleep(0.05)
+
+    assert table.claim("alive", lease_seconds=60)[0] == lease_id
+    assert not table.renew(lease_id, "dead", 60)
+    assert not table.complete(lease_id, "dead")
+    assert table.complete(lease_id, "alive")
+    table.close()
+
+
+def test_release_without_counting_attempt(tmp_path):
+    table = LeaseTable(str(tmp_path / "leases.db"), max_attempts=1)
+    table.add_entries([("https://example.com/1", "Track 1")])
+
+    lease_id = table.claim("broken", lease_seconds=60)[0]
+    table.release(lease_id, "broken", count_attempt=False)
+    assert table.counts() == {"pending": 1}
+
+    table.claim("worker", lease_seconds=60)
+    table.release(lease_id, "worker")
+    assert table.counts() == {"failed": 1}
+    table.close()
@@ -0,0 +1,77 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from LibraryIndex import LibraryIndex  # noqa: E402
+from TemplateDatabase import TemplateDatabase  # noqa: E402
+
+
+def default_templates():
+    db = TemplateDatabase(":memory:")
+    db.add_default_templates()
+    templates = [(t[1], t[2]) for t in db.get_all_templates()]
+    db.close()
+    return templates
+
+
+def make_library(tmp_path, *filenames, templates=None):
+    for filename in filenames:
+        (tmp_path / filename).write_bytes(b"")
+    if templates is None:
+        templates = default_templates()
+    index = LibraryIndex(str(tmp_path), templates)
+    index.sync()
+    return index
+
+
+def test_normalize_ignores_case_and_punctuation(tmp_path):
+    index = LibraryIndex(str(tmp_path), [])
+    assert index.normalize("Artist - Song!") == index.normalize("artist_song")
+
+
+def test_topic_uploader_is_stripped(tmp_path):
+    index = make_library(tmp_path, "Artist - Song.m4a")
+    info = {"title": "Song", "uploader": "Artist - Topic"}
+
+    assert index.candidate_names(info) == ["Artist - Song"]
+    assert index.find(info) is not None
+
+
+def test_bare_title_only_without_artist(tmp_path):
+    index = make_library(tmp_path, "Intro.m4a")
+
+    assert index.find({"title": "Intro"}) is not None
+    assert index.find({"title": "Intro", "uploader": "Someone Else"}) is None
+
+
+def test_templated_file_names_match(tmp_path):
+    index = make_library(tmp_path, "Artist_-_Artist_-_Song (Official Video).m4a")
+
+    assert index.find({"title": "Song", "artist": "Artist"}) is not None
+
+
+def test_file_removed_between_syncs(tmp_path):
+    index = make_library(tmp_path, "Artist - Song.m4a", "Artist - Song.opus")
+    info = {"title": "Song", "artist": "Artist"}
+
+    os.remove(tmp_path / "Artist - Song.m4a")
+    index.sync()
+    assert index.find(info) is not None
+    assert len(index) == 1
+
+    os.remove(tmp_path / "Artist - Song.opus")
+    index.sync()
+    assert index.find(info) is None
+    assert len(index) == 0
+
+
+def test_set_templates_rebuilds_keys(tmp_path):
+    index = make_library(tmp_path, "Artist - Song (Live).m4a", templates=[])
+    info = {"title": "Song", "artist": "Artist"}
+    assert index.find(info) is None
+
+    index.set_templates([(r"\s*\(\s*live\s*\)", "")])
+    assert len(index) == 0
+    index.sync()
+    assert index.find(info) is not None